@@ -1,9 +1,32 @@
-# Functions for choosing optimizer and model using their string names.
+# Functions for choosing tokenizer, optimizer and model using their string names.
 
+from functools import lru_cache
 from models import *
+from tokenizers import *
 import torch.optim as optim
 
 
+@lru_cache(maxsize=None)
+def choose_tokenizer(tokenizer_name):
+    # chooses tokenizer from tokenizers.py by string name, one instance per name is created and reused
+    if tokenizer_name == 'spacy':
+        return Spacy()
+    elif tokenizer_name == 'whitespace':
+        return WhitespaceTokenizer()
+    elif tokenizer_name == 'custom':
+        return CustomTokenizer()
+    elif tokenizer_name == 'regex':
+        return RegexTokenizer()
+    elif tokenizer_name == 'lowerspacy':
+        return LowerSpacy()
+    elif tokenizer_name == 'gnews_sw':
+        return GNewsTokenizerSW()
+    elif tokenizer_name == 'gnews_num':
+        return GNewsTokenizerNum()
+    else:
+        return tokenizer_name
+
+
 def choose_model(model_name, text, n_layers, hidden_dim, dropout):
     # chooses model from models.py by model string name
     model = globals()[model_name](text.vocab.vectors,
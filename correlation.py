@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 # Script prints correlations between different predictions read from csv files.
 
+import numpy as np
 import pandas as pd
 import sys
+from scipy.stats import rankdata, kendalltau
 from ensemble import get_pred_path
 
 # arguments are prediction file names chosen from dictionary keys at ens_model_list.py
@@ -12,15 +14,20 @@ second_file = sys.argv[2]
 def corr(first_model, second_model):
   pred_file_name = 'val_probs.csv'
   first_path, second_path = [get_pred_path(m, pred_file_name) for m in [first_model, second_model]]
-  first_df = pd.read_csv(first_path, index_col=0)
-  second_df = pd.read_csv(second_path, index_col=0)
+  # read only qid and prediction columns
+  first_df = pd.read_csv(first_path, index_col=0, usecols=[0, 1])
+  second_df = pd.read_csv(second_path, index_col=0, usecols=[0, 1])
   prediction = first_df.columns[0]
+  # align predictions by qid once, keep only common qids, then compute correlations on numpy arrays
+  joined = first_df[[prediction]].join(second_df[[prediction]], how='inner', rsuffix='_2')
+  a = joined[prediction].values
+  b = joined[prediction + '_2'].values
   # correlations
   print("Finding correlation between: {} and {}".format(first_file,second_file))
   print("Column to be measured: {}".format(prediction))
-  print("Pearson's correlation score: {}".format(first_df[prediction].corr(second_df[prediction], method='pearson')))
-  print("Kendall's correlation score: {}".format(first_df[prediction].corr(second_df[prediction], method='kendall')))
-  print("Spearman's correlation score: {}".format(first_df[prediction].corr(second_df[prediction], method='spearman')))
+  print("Pearson's correlation score: {}".format(np.corrcoef(a, b)[0, 1]))
+  print("Kendall's correlation score: {}".format(kendalltau(a, b).correlation))
+  print("Spearman's correlation score: {}".format(np.corrcoef(rankdata(a), rankdata(b))[0, 1]))
 
 if __name__ == '__main__':
   corr(first_file, second_file)
@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 # Script runs main.py with different parameters and ensembles predictions made by main.py.
 
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 from ensemble import *
 from main import *
 
@@ -8,18 +11,83 @@ from main import *
 def parse_ens_main_args():
     parser = argparse.ArgumentParser(parents=[ens_parser(add_help=False)])
     arg = parser.add_argument
+    arg('--n_gpus', '-ng', default=1, type=int, help='Number of gpus for training models in parallel.')
     arg('--main_args', '-a', nargs='+', default=["-e 6 --seed 1", "-em paragram -us 0.1 -e 4 --seed 42", "-em wnews -us 0.1 -lr 0.0025 -we 10 -e 7 --seed 13", "-em gnews -us 0.1 -lr 0.002 -e 5 --seed 77", "-m LinPool3 -em glove paragram wnews -lr 0.002 -we 20 -e 10 -hd 100 --seed 3 -mv 1500000"], type=str)
     args = parser.parse_args()
     return args
 
 
+def run_on_gpu(gpu, indexed_args):
+    """ Runs main() for each (index, args) pair on one gpu. Each gpu has own working directory
+        tmp/ens_workers/{gpu} with own tmp and models dirs, data and notes dirs are shared.
+        Finished run dirs are moved to ./models of repo root.
+        Returns list of (index, record dir relative to repo root)."""
+    # gpu indexes into an existing CUDA_VISIBLE_DEVICES mask, if any
+    visible = os.environ.get('CUDA_VISIBLE_DEVICES')
+    os.environ['CUDA_VISIBLE_DEVICES'] = visible.split(',')[gpu] if visible is not None else str(gpu)
+    root = os.getcwd()
+    root_models_dir = os.path.join(root, 'models')
+    os.makedirs(root_models_dir, exist_ok=True)
+    work_dir = os.path.join(root, 'tmp', 'ens_workers', str(gpu))
+    os.makedirs(work_dir, exist_ok=True)
+    for d in ['data', 'notes']:
+        os.makedirs(os.path.join(root, d), exist_ok=True)
+        link = os.path.join(work_dir, d)
+        if not os.path.exists(link):
+            os.symlink(os.path.join(root, d), link)
+    os.chdir(work_dir)
+    record_dirs = []
+    for i, a in indexed_args:
+        record_dir = main(a)
+        moved = move_run_dirs('models', root_models_dir)
+        record_dirs.append((i, os.path.join('./models', moved[os.path.basename(record_dir)])))
+    return record_dirs
+
+
+def move_run_dirs(models_dir, dest_dir):
+    """ Moves run dirs (all folds) in creation order, so find_k_dirs finds them in the same order.
+        Run dirs are named by time with one second resolution, so runs on other gpus may have taken the name,
+        then suffix _1, _2, ... is added. Returns dict {old name: new name}."""
+    run_dirs = [os.path.join(models_dir, d) for d in os.listdir(models_dir)]
+    run_dirs = sorted([d for d in run_dirs if os.path.isdir(d)], key=os.path.getctime)
+    moved = {}
+    for d in run_dirs:
+        name = os.path.basename(d)
+        new_name, n = name, 0
+        while os.path.exists(os.path.join(dest_dir, new_name)):
+            n += 1
+            new_name = f'{name}_{n}'
+        os.rename(d, os.path.join(dest_dir, new_name))
+        moved[name] = new_name
+    return moved
+
+
+def run_parallel(main_args, n_gpus):
+    # models are distributed between gpus, each gpu trains its models one by one
+    n_gpus = min(n_gpus, len(main_args))
+    visible = os.environ.get('CUDA_VISIBLE_DEVICES')
+    if visible is not None:
+        n_gpus = min(n_gpus, len(visible.split(',')))
+    indexed_args = list(enumerate(main_args))
+    groups = [indexed_args[g::n_gpus] for g in range(n_gpus)]
+    record_dirs = [None] * len(main_args)
+    with ProcessPoolExecutor(max_workers=n_gpus) as executor:
+        for group in executor.map(run_on_gpu, range(n_gpus), groups):
+            for i, record_dir in group:
+                record_dirs[i] = record_dir
+    return record_dirs
+
+
 if __name__ == '__main__':
     args = parse_ens_main_args()
     main_args = [a.split() for a in args.main_args]
-    record_dirs = []
-    for a in main_args:
-        record_dir = main(a)
-        record_dirs.append(record_dir)
+    if args.n_gpus > 1:
+        record_dirs = run_parallel(main_args, args.n_gpus)
+    else:
+        record_dirs = []
+        for a in main_args:
+            record_dir = main(a)
+            record_dirs.append(record_dir)
     ens = Ensemble.from_dirs(record_dirs)
     ens(args.method, args.thresh, args)
 
@@ -5,13 +5,13 @@ import numpy as np
 import torch
 import torch.nn as nn
 import os
-from sklearn.metrics import f1_score
-import warnings
 import time
 import sys
 
-from utils import f1_metric, print_duration, get_hash, str_date_time, dict_to_csv, save_plot, copy_files, save_plots, \
-    pred_to_csv
+from utils import f1_metric, print_duration, get_hash, str_date_time, dict_to_csv, save_plot, copy_files, save_plots
+from utils import pred_to_csv, nullcontext
+
+amp = getattr(torch.cuda, 'amp', None)  # mixed precision requires torch>=1.6
 
 
 class Learner:
@@ -23,6 +23,9 @@ class Learner:
         self.scheduler = scheduler
         self.recorder = Recorder(args)
         self.args = args
+        if args.amp and amp is None:
+            raise Exception('Mixed precision training requires torch>=1.6')
+        self.scaler = amp.GradScaler() if args.amp else None
 
         if len(dataloaders) == 3:
             self.train_dl, self.val_dl, self.test_dl = dataloaders
@@ -36,9 +39,13 @@ class Learner:
     @staticmethod
     def to_cuda(data):
         if type(data) == tuple:
-            return [tensor.cuda() for tensor in data]
+            return [to_gpu(tensor) for tensor in data]
         else:
-            return [data.cuda(), None]
+            return [to_gpu(data), None]
+
+    def autocast(self):
+        # mixed precision context if args.amp else empty context
+        return amp.autocast() if self.args.amp else nullcontext()
 
     def fit(self, epoch, n_eval, tresh, early_stop, warmup_epoch, clip):
 
@@ -49,10 +56,13 @@ class Learner:
         no_improve_epoch = 0
         no_improve_in_previous_epoch = False
         fine_tuning = False
-        losses = []
         best_test_info = None
         torch.backends.cudnn.benchmark = False
-        eval_every = int(len(list(iter(self.train_dl))) / n_eval)
+        steps_per_epoch = len(self.train_dl)
+        eval_every = int(steps_per_epoch / n_eval)
+        # train losses and grad norms of all steps stay on gpu, no sync at every step
+        tr_losses = torch.zeros(epoch * steps_per_epoch, device='cuda')
+        grad_norms = torch.zeros(epoch * steps_per_epoch, device='cuda')
 
         time_start = time.time()
         print(self.model)
@@ -72,16 +82,19 @@ class Learner:
                 fine_tuning = True
             self.train_dl.init_epoch()
 
-            for train_batch in iter(self.train_dl):
+            for model_input, y in Prefetcher(self.train_dl):
                 step += 1
                 self.model.zero_grad()
                 self.model.train()
-                model_input = self.to_cuda(train_batch.text)
-                y = train_batch.target.type(torch.Tensor).cuda()
-                pred = self.model.forward(*model_input).view(-1)
-                loss = self.loss_func(pred, y)
-                self.recorder.tr_record.append({'tr_loss': loss.cpu().data.numpy()})
-                loss.backward()
+                with self.autocast():
+                    pred = self.model.forward(*model_input).view(-1)
+                    loss = self.loss_func(pred, y)
+                tr_losses[step - 1] = loss.detach()
+                if self.scaler:
+                    self.scaler.scale(loss).backward()
+                    self.scaler.unscale_(self.optimizer)
+                else:
+                    loss.backward()
                 total_norm = nn.utils.clip_grad_norm_(self.model.parameters(), clip)
                 # parameters = list(filter(lambda p: p.grad is not None, self.model.parameters()))
                 # total_norm = 0
@@ -90,15 +103,18 @@ class Learner:
                 #     total_norm += param_norm.item() ** 2
                 # total_norm = total_norm ** (1. / 2)
 
-                self.recorder.norm_record.append({'grad_norm': total_norm})
-                self.optimizer.step()
+                grad_norms[step - 1] = total_norm
+                if self.scaler:
+                    self.scaler.step(self.optimizer)
+                    self.scaler.update()
+                else:
+                    self.optimizer.step()
 
                 if step % eval_every == 0:
                     # self.scheduler.step()
                     with torch.no_grad():
                         # train evaluation
-                        losses.append(loss.cpu().data.numpy())
-                        train_loss = np.mean(losses)
+                        train_loss = tr_losses[eval_every - 1:step:eval_every].mean().item()
 
                         # val evaluation
                         val_loss, val_f1, val_ids, val_prob, val_true = self.evaluate(self.val_dl, tresh)
@@ -125,6 +141,8 @@ class Learner:
                         #        best_test_info = test_info
 
         tr_time = print_duration(time_start, 'training time: ')
+        self.recorder.tr_record = [{'tr_loss': l} for l in tr_losses[:step].tolist()]
+        self.recorder.norm_record = [{'grad_norm': n} for n in grad_norms[:step].tolist()]
         self.recorder.append_info({'ep_time': tr_time/(e + 1)})
 
         #if self.args.test:
@@ -145,30 +163,31 @@ class Learner:
             if hasattr(self.model, 'cell'):
                 self.model.cell.flatten_parameters()
             self.model.eval()
-            self.model.zero_grad()
-            loss = []
-            tp = 0
-            n_targs = 0
-            n_preds = 0
+            loss = 0
+            tp = n_targs = n_preds = 0
             probs = []
             targs = []
             ids = []
+            # metrics are accumulated on gpu and copied to cpu once after the loop
             for batch in iter(dl):
                 model_input = self.to_cuda(batch.text)
-                y = batch.target.type(torch.Tensor).cuda()
-                pred = self.model.forward(*model_input).view(-1)
-                loss.append(self.loss_func(pred, y).cpu().data.numpy())
-                prob = torch.sigmoid(pred).cpu().data.numpy()
-                label = (prob > tresh).astype(int)
-                y = y.cpu().data.numpy()
-                tp += sum(y + label == 2)
-                n_targs += sum(y)
-                n_preds += sum(label)
-                probs += prob.tolist()
-                targs += y.tolist()
-                ids += batch.qid.view(-1).data.numpy().tolist()
-            f1 = f1_metric(tp, n_targs, n_preds)
-            loss = np.mean(loss)
+                y = to_gpu(batch.target.type(torch.Tensor))
+                with self.autocast():
+                    pred = self.model.forward(*model_input).view(-1).float()
+                    loss += self.loss_func(pred, y)
+                prob = torch.sigmoid(pred)
+                label = (prob > tresh).float()
+                tp += (y * label).sum()
+                n_targs += y.sum()
+                n_preds += label.sum()
+                probs.append(prob)
+                targs.append(y)
+                ids.append(batch.qid.view(-1))
+            f1 = f1_metric(int(tp.item()), int(n_targs.item()), int(n_preds.item()))
+            loss = loss.item() / len(probs)
+            probs = torch.cat(probs).cpu().numpy().tolist()
+            targs = torch.cat(targs).cpu().numpy().tolist()
+            ids = torch.cat(ids).numpy().tolist()
         return loss, f1, ids, probs, targs
 
     def predict_probs(self, is_test=False):
@@ -182,17 +201,24 @@ class Learner:
         if hasattr(self.model, 'cell'):
             self.model.cell.flatten_parameters()
         self.model.eval()
-        y_pred = []
-        y_true = []
-        ids = []
+        has_target = not is_test or self.args.test
+        n = len(dl.dataset)
+        y_pred = np.empty(n, dtype=np.float32)
+        y_true = np.empty(n if has_target else 0, dtype=np.int8)
+        ids = np.empty(n, dtype=np.int64)
 
+        offset = 0
         dl.init_epoch()
         for batch in iter(dl):
             model_input = self.to_cuda(batch.text)
-            if not is_test or self.args.test:
-                y_true += batch.target.data.numpy().tolist()
-            y_pred += torch.sigmoid(self.model.forward(*model_input).view(-1)).cpu().data.numpy().tolist()
-            ids += batch.qid.view(-1).data.numpy().tolist()
+            with torch.no_grad(), self.autocast():
+                pred = self.model.forward(*model_input).view(-1).float()
+            end = offset + pred.shape[0]
+            y_pred[offset:end] = torch.sigmoid(pred).cpu().numpy()
+            if has_target:
+                y_true[offset:end] = batch.target.numpy()
+            ids[offset:end] = batch.qid.view(-1).numpy()
+            offset = end
         return y_pred, y_true, ids
 
     def predict_labels(self, is_test=False, thresh=0.5):
@@ -209,6 +235,43 @@ class Learner:
 
 
 
+class Prefetcher:
+    """Iterates over dataloader and yields (model_input, y) already copied to gpu.
+    Next batch is copied on side cuda stream while current batch is processed."""
+
+    def __init__(self, dl):
+        self.dl = dl
+        self.stream = torch.cuda.Stream()
+
+    def __iter__(self):
+        loaded = None
+        for batch in iter(self.dl):
+            next_loaded = self.preload(batch)
+            if loaded is not None:
+                yield self.wait(*loaded)
+            loaded = next_loaded
+        if loaded is not None:
+            yield self.wait(*loaded)
+
+    def preload(self, batch):
+        with torch.cuda.stream(self.stream):
+            model_input = Learner.to_cuda(batch.text)
+            y = to_gpu(batch.target.type(torch.Tensor))
+            copied = torch.cuda.Event()
+            copied.record(self.stream)
+        return model_input, y, copied
+
+    @staticmethod
+    def wait(model_input, y, copied):
+        # wait only for copy of this batch, copy of next batch continues
+        current_stream = torch.cuda.current_stream()
+        current_stream.wait_event(copied)
+        for tensor in [*model_input, y]:
+            if tensor is not None:
+                tensor.record_stream(current_stream)
+        return model_input, y
+
+
 class Recorder:
 
     models_dir = './models'
@@ -299,6 +362,11 @@ class Recorder:
         return subdir
 
 
+def to_gpu(tensor):
+    # copy from pinned memory is asynchronous and doesn't block cpu
+    return tensor.pin_memory().cuda(non_blocking=True)
+
+
 def format_info(info):
     keys = list(info.keys())
     values = list(info.values())
@@ -308,19 +376,23 @@ def format_info(info):
 
 
 def choose_thresh(probs, true, thresh_range, message=True):
+    # F1 score for all thresholds at once: sort probs once and count true positives with cumulative sum
     min_th, max_th, th_step = thresh_range
-    tmp = [0, 0, 0]  # idx, current_f1, max_f1
-    th = min_th
-    for tmp[0] in np.arange(min_th, max_th, th_step):
-        with warnings.catch_warnings():
-            warnings.simplefilter('ignore')
-            tmp[1] = f1_score(true, probs > tmp[0])
-        if tmp[1] > tmp[2]:
-            th = tmp[0]
-            tmp[2] = tmp[1]
+    thresholds = np.arange(min_th, max_th, th_step)
+    if len(thresholds) == 0:
+        return min_th, 0
+    probs = np.asarray(probs, dtype=float)
+    true = np.asarray(true, dtype=float)
+    order = np.argsort(-probs, kind='mergesort')
+    tp_cum = np.concatenate([[0], np.cumsum(true[order])])
+    # number of predictions with prob > threshold
+    n_preds = len(probs) - np.searchsorted(probs[order][::-1], thresholds, side='right')
+    tp = tp_cum[n_preds]
+    denom = n_preds + true.sum()
+    f1s = np.divide(2 * tp, denom, out=np.zeros_like(thresholds), where=denom > 0)
+    best = np.argmax(f1s)
+    th, max_f1 = thresholds[best], f1s[best]
     if message:
-        print('best threshold is {:.4f} with F1 score: {:.4f}'.format(th, tmp[2]))
-
-    return th, tmp[2]
-
+        print('best threshold is {:.4f} with F1 score: {:.4f}'.format(th, max_f1))
 
+    return th, max_f1
@@ -37,6 +37,7 @@ def parse_main_args(main_args=None):
     arg('--unk_std', '-us', default = 0.001, type=float, help='Standart deviation for initialization\
                                                                of tokens without embedding vector.')
     arg('--stratified', '-s', action='store_true', help='Stratified split.')
+    arg('--parallel_tokenize', '-pt', action='store_true', help='Tokenize data in parallel processes.')
 
     # training params
     arg('--optim', '-o', default='Adam', choices=['Adam', 'AdamW'], help='Optimizer. See choose.py')
@@ -49,6 +50,7 @@ def parse_main_args(main_args=None):
     arg('--early_stop', '-es', default=2, type=int, help='Stop training if no improvement during this number of epochs.')
     arg('--f1_tresh', '-ft', default=0.335, type=float, help='Threshold for calculation of F1-score.')
     arg('--clip', type=float, default=1, help='Gradient clipping.')
+    arg('--amp', action='store_true', help='Mixed precision training and inference. Requires torch>=1.6.')
 
     # model params
     arg('--model', '-m', default='BiLSTMPool', help='Model name. See models.py.')
@@ -130,7 +132,7 @@ def job(args, train_csv, test_csv, embeddings, cache):
     # read and preprocess data
     to_cache = not args.no_cache
     data.read_embedding(embeddings, args.unk_std, args.max_vectors, to_cache)
-    data.preprocess(args.tokenizer, args.var_length)
+    data.preprocess(args.tokenizer, args.var_length, args.parallel_tokenize, to_cache)
     data.embedding_lookup()
 
     # split train dataset
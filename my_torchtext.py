@@ -84,6 +84,32 @@ class MyTabularDataset(TabularDataset):
 
         super(TabularDataset, self).__init__(examples, fields, **kwargs)
 
+    @classmethod
+    def from_df(cls, df, fields, **kwargs):
+        """Create dataset from pandas DataFrame without parsing csv file.
+
+        Arguments:
+            df (pandas.DataFrame): Data. Already tokenized columns should contain lists of tokens.
+            fields (dict[str: tuple(str, Field)]): Keys are df column names,
+                values are tuples of (name, field).
+        """
+        columns = list(fields.keys())
+        field_list = [fields[c] for c in columns]
+        examples = [Example.fromlist(row, field_list) for row in df[columns].itertuples(index=False)]
+        return cls.from_examples(examples, fields, **kwargs)
+
+    @classmethod
+    def from_examples(cls, examples, fields, **kwargs):
+        """Create dataset from list of already preprocessed examples.
+
+        Arguments:
+            examples (list(Example)): Examples, e.g. loaded from cache.
+            fields (dict[str: tuple(str, Field)]): Values are tuples of (name, field).
+        """
+        dataset = cls.__new__(cls)
+        super(TabularDataset, dataset).__init__(examples, list(fields.values()), **kwargs)
+        return dataset
+
     def split(self, split_ratio=0.8, stratified=False, strata_field='target',
               random_state=None):
         splits = super().split(split_ratio, stratified=stratified, strata_field=strata_field, random_state=random_state)
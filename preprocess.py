@@ -2,14 +2,19 @@
 # Function iterate that creates iterators.
 
 import torch
+import numpy as np
 import time
 import random
 import pickle
 import os
+import hashlib
+import multiprocessing as mp
 from functools import partial
+import pandas as pd
 import torchtext.data as data
 
-from tokenizers import *
+from tokenizers import GNewsTokenizerPhrase, GNewsTokenizerPhraseNum
+from choose import choose_tokenizer
 from utils import print_duration
 from my_torchtext import MyTabularDataset, MyVectors
 
@@ -29,64 +34,123 @@ class Data:
         self.test = None
         self.target = None
         self.vectors = []
+        self.emb_params = None
 
     def choose_tokenizer(self, tokenizer):
-        if tokenizer == 'whitespace':
-            return WhitespaceTokenizer()
-        elif tokenizer == 'custom':
-            return CustomTokenizer()
-        elif tokenizer == 'lowerspacy':
-            return LowerSpacy()
-        elif tokenizer == 'gnews_sw':
-            return GNewsTokenizerSW()
-        elif tokenizer == 'gnews_num':
-            return GNewsTokenizerNum()
-        elif tokenizer == 'gnews_ph':
-            emb_set = set(self.vectors.itos)
+        # phrase tokenizers depend on embedding tokens, other tokenizers are chosen by name only
+        if tokenizer == 'gnews_ph':
+            emb_set = set(t for v in self.load_embedding() for t in v.itos)
             return GNewsTokenizerPhrase(emb_set)
         elif tokenizer == 'gnews_ph_num':
-            emb_set = set(self.vectors.itos)
+            emb_set = set(t for v in self.load_embedding() for t in v.itos)
             return GNewsTokenizerPhraseNum(emb_set)
         else:
-            return tokenizer
+            return choose_tokenizer(tokenizer)
 
-    def preprocess(self, tokenizer_name, var_length=False):
+    def preprocess(self, tokenizer_name, var_length=False, parallel=False, to_cache=True):
         # types of csv columns
         time_start = time.time()
         tokenizer = self.choose_tokenizer(tokenizer_name)
         self.text = data.Field(batch_first=True, tokenize=tokenizer, include_lengths=var_length)
         self.qid = data.Field()
         self.target = data.Field(sequential=False, use_vocab=False, is_target=True)
+        train_fields = {'qid': ('qid', self.qid),
+                        'question_text': ('text', self.text),
+                        'target': ('target', self.target)}
+        test_fields = {'qid': ('qid', self.qid),
+                       'question_text': ('text', self.text)}
+
+        # load tokenized data and vocab from cache
+        cache_path = self.prep_cache_path(tokenizer_name) if to_cache else None
+        if to_cache and os.path.exists(cache_path):
+            print('load tokenized data and vocab from cache...')
+            with open(cache_path, 'rb') as f:
+                train_examples, test_examples, self.text.vocab, self.qid.vocab = pickle.load(f)
+            self.train = MyTabularDataset.from_examples(train_examples, train_fields)
+            self.test = MyTabularDataset.from_examples(test_examples, test_fields)
+            print_duration(time_start, 'time to load tokenized data and vocab: ')
+            return
 
         # read and tokenize data
         print('read and tokenize data...')
-        self.train = MyTabularDataset(path=self.train_csv, format='csv',
-                                 fields={'qid': ('qid', self.qid),
-                                         'question_text': ('text', self.text),
-                                         'target': ('target', self.target)})
-
-        self.test = MyTabularDataset(path=self.test_csv, format='csv',
-                                fields={'qid': ('qid', self.qid),
-                                        'question_text': ('text', self.text)})
+        if parallel:
+            self.train, self.test = self._tokenize_column(train_fields, test_fields)
+        else:
+            self.train = MyTabularDataset.from_df(self._read_df(self.train_csv, train_fields), train_fields)
+            self.test = MyTabularDataset.from_df(self._read_df(self.test_csv, test_fields), test_fields)
         print_duration(time_start, 'time to read and tokenize data: ')
         self.text.build_vocab(self.train, self.test, min_freq=1)
         self.qid.build_vocab(self.train, self.test)
         print_duration(time_start, 'time to read, tokenize and build vocab: ')
+        if to_cache:
+            prep = (self.train.examples, self.test.examples, self.text.vocab, self.qid.vocab)
+            _atomic_dump(cache_path, lambda f: pickle.dump(prep, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def prep_cache_path(self, tokenizer_name):
+        # cache file name depends on tokenizer, paths and modification times of data files
+        key = f'{tokenizer_name}'
+        for path in [self.train_csv, self.test_csv]:
+            key += f'_{os.path.abspath(path)}_{os.path.getmtime(path)}'
+        if tokenizer_name.startswith('gnews_ph'):
+            # phrase tokenizers depend on embedding tokens
+            key += f'_{[len(v.itos) for v in self.load_embedding()]}'
+        key = hashlib.md5(key.encode()).hexdigest()
+        return os.path.join(self.cache, f'prep_{key}.pkl')
+
+    @staticmethod
+    def _read_df(path, cols):
+        # reads only needed csv columns with pandas C parser, values are kept as strings like in csv reader
+        return pd.read_csv(path, usecols=list(cols), dtype=str, keep_default_na=False, engine='c')
+
+    def _tokenize_column(self, train_fields, test_fields):
+        # tokenizes question_text of train and test csv in one pool of processes
+        train_df = self._read_df(self.train_csv, train_fields)
+        test_df = self._read_df(self.test_csv, test_fields)
+        texts = train_df['question_text'].tolist() + test_df['question_text'].tolist()
+        tokens = parallel_tokenize(texts, self.text.tokenize)
+        n_train = len(train_df)
+        train_df['question_text'] = pd.Series(tokens[:n_train], index=train_df.index)
+        test_df['question_text'] = pd.Series(tokens[n_train:], index=test_df.index)
+        train = MyTabularDataset.from_df(train_df, train_fields)
+        test = MyTabularDataset.from_df(test_df, test_fields)
+        return train, test
 
     def read_embedding(self, embeddings, unk_std, max_vectors, to_cache):
+        # embedding files are read lazily by load_embedding: not needed if vocab vectors are cached
+        self.emb_params = (embeddings, unk_std, max_vectors, to_cache)
+
+    def load_embedding(self):
+        if self.vectors:
+            return self.vectors
         time_start = time.time()
+        embeddings, unk_std, max_vectors, to_cache = self.emb_params
         unk_init = partial(normal_init, std=unk_std)
         for emb in embeddings:
             self.vectors.append(MyVectors(emb, cache=self.cache, to_cache=to_cache, unk_init=unk_init, max_vectors=max_vectors))
         print_duration(time_start, 'time to read embedding: ')
+        return self.vectors
 
     def embedding_lookup(self):
         print('embedding lookup...')
         time_start = time.time()
-        self.text.vocab.load_vectors(self.vectors)
+        to_cache = self.emb_params[3]
+        cache_path = self.vectors_cache_path()
+        if to_cache and os.path.exists(cache_path):
+            # memory mapped copy-on-write, so the cache file stays read-only if vectors are modified
+            self.text.vocab.vectors = torch.from_numpy(np.load(cache_path, mmap_mode='c'))
+        else:
+            self.text.vocab.load_vectors(self.load_embedding())
+            if to_cache:
+                _atomic_dump(cache_path, lambda f: np.save(f, self.text.vocab.vectors.numpy()))
         print_duration(time_start, 'time for embedding lookup: ')
         return
 
+    def vectors_cache_path(self):
+        # cache file name depends on vocab tokens and embedding params
+        md5 = hashlib.md5(str(self.emb_params[:3]).encode())
+        md5.update('\n'.join(self.text.vocab.itos).encode('utf-8', 'surrogatepass'))
+        return os.path.join(self.cache, f'vecs_{md5.hexdigest()}.npy')
+
     def split(self, kfold, split_ratio, stratified, is_test, seed):
         random.seed(seed)
         if kfold:
@@ -96,7 +160,39 @@ class Data:
         return data_iter
 
 
-def iterate(train, val, test, batch_size):
+def _atomic_dump(path, write_fn):
+    # write to temporary file first: parallel runs may write the same cache
+    tmp_path = f'{path}.{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        write_fn(f)
+    os.replace(tmp_path, path)
+
+
+_tokenizer = None  # tokenizer for worker processes, inherited by fork
+
+
+def _tokenize_texts(texts):
+    # strips trailing newline like torchtext Field.preprocess does before tokenization
+    return [_tokenizer(t.rstrip('\n')) for t in texts]
+
+
+def parallel_tokenize(texts, tokenizer, n_jobs=None, chunk_size=2000):
+    # tokenizes list of texts in n_jobs processes (all cpu cores by default)
+    # workers are forked explicitly, so they get the tokenizer without pickling it
+    global _tokenizer
+    _tokenizer = tokenizer
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    try:
+        with mp.get_context('fork').Pool(n_jobs or os.cpu_count()) as pool:
+            tokenized = pool.map(_tokenize_texts, chunks)
+    finally:
+        _tokenizer = None
+    return [tokens for chunk in tokenized for tokens in chunk]
+
+
+def iterate(train, val, test, batch_size, infer_batch_size=None):
+    # inference needs no gradients, so val and test batches are bigger and sorted by length to reduce padding
+    infer_batch_size = infer_batch_size or batch_size * 4
     train_iter = data.BucketIterator(dataset=train,
                                      batch_size=batch_size,
                                      sort_key=lambda x: x.text.__len__(),
@@ -105,18 +201,16 @@ def iterate(train, val, test, batch_size):
                                      sort_within_batch=True)
 
     val_iter = data.BucketIterator(dataset=val,
-                                   batch_size=batch_size,
+                                   batch_size=infer_batch_size,
                                    sort_key=lambda x: x.text.__len__(),
                                    train=False,
-                                   sort=False,
+                                   sort=True,
                                    sort_within_batch=True)
 
     test_iter = data.BucketIterator(dataset=test,
-                                    batch_size=batch_size,
+                                    batch_size=infer_batch_size,
                                     sort_key=lambda x: x.text.__len__(),
-                                    sort=False,
+                                    sort=True,
                                     train=False,
                                     sort_within_batch=True)
     return train_iter, val_iter, test_iter
-
-
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from sklearn.metrics import f1_score
+from learner import choose_thresh
+
+
+def loop_choose_thresh(probs, true, thresh_range):
+    best_th, max_f1 = thresh_range[0], 0
+    for th in np.arange(*thresh_range):
+        f1 = f1_score(true, probs > th)
+        if f1 > max_f1:
+            best_th, max_f1 = th, f1
+    return best_th, max_f1
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_choose_thresh(seed):
+    rnd = np.random.RandomState(seed)
+    true = rnd.randint(0, 2, 1000)
+    probs = np.clip(true * 0.3 + rnd.rand(1000) * 0.7, 0, 1).round(2)
+    thresh_range = [0.1, 0.5, 0.01]
+    th, max_f1 = choose_thresh(probs, true, thresh_range, message=False)
+    _, expected_f1 = loop_choose_thresh(probs, true, thresh_range)
+    assert max_f1 == pytest.approx(expected_f1)
+    assert f1_score(true, probs > th) == pytest.approx(expected_f1)
+
+
+def test_choose_thresh_no_positive_predictions():
+    th, max_f1 = choose_thresh([0.1, 0.2], [0, 1], [0.5, 0.9, 0.1], message=False)
+    assert th == pytest.approx(0.5)
+    assert max_f1 == 0
+
+
+def test_choose_thresh_empty_range():
+    assert choose_thresh([0.1, 0.7], [0, 1], [0.5, 0.5, 0.1], message=False) == (0.5, 0)
@@ -0,0 +1,12 @@
+import pytest
+import torchtext.data as data
+from preprocess import parallel_tokenize
+from tokenizers import WhitespaceTokenizer
+
+
+@pytest.mark.parametrize("n_jobs, chunk_size", [(1, 10), (2, 2)])
+def test_parallel_tokenize(n_jobs, chunk_size):
+    texts = ['Why is it so?', 'a b\n', 'one', 'trailing newline\n', 'x  y']
+    field = data.Field(tokenize=WhitespaceTokenizer())
+    expected = [field.preprocess(t) for t in texts]
+    assert parallel_tokenize(texts, field.tokenize, n_jobs=n_jobs, chunk_size=chunk_size) == expected
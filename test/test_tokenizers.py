@@ -0,0 +1,21 @@
+import pytest
+from tokenizers import CustomTokenizer, RegexTokenizer
+
+
+@pytest.mark.parametrize("test_input, expected", [
+    ('Why is it so?', ['Why', 'is', 'it', 'so', '?']),
+    ('(really)!?', ['(', 'really', ')', '!', '?']),
+    ('a,b  c', ['a', ',', 'b', 'c']),
+])
+def test_custom_tokenizer(test_input, expected):
+    assert CustomTokenizer()(test_input) == expected
+
+
+@pytest.mark.parametrize("test_input, expected", [
+    ('Why is Quora so GOOD?', ['why', 'is', 'quora', 'so', 'good', '?']),
+    ("Isn't 2018 over...", ['isn', "'", 't', '2018', 'over', '.', '.', '.']),
+    ('Café in Zürich?', ['café', 'in', 'zürich', '?']),
+    ('Привет, мир!', ['привет', ',', 'мир', '!']),
+])
+def test_regex_tokenizer(test_input, expected):
+    assert RegexTokenizer()(test_input) == expected
@@ -1,18 +1,28 @@
 # different tokenizers
 import re
+from functools import lru_cache
 import spacy
 from stop_words import GNEWS_STOP_WORDS
 
 
+@lru_cache()
+def load_spacy():
+    # loads spacy model once per process, only tokenizer is used
+    return spacy.load('en', disable=['parser', 'tagger', 'ner'])
+
+
 class Spacy:
     def __init__(self):
-        self.spacy_en = spacy.load('en')
+        self.spacy_en = load_spacy()
         self.tokenizer = self.spacy_en.tokenizer
 
+    def __call__(self, x):
+        return [tok.text for tok in self.tokenizer(x)]
+
 
 class LowerSpacy(object):
     def __init__(self):
-        self.tokenizer = spacy.load('en').tokenizer
+        self.tokenizer = load_spacy().tokenizer
 
     def __call__(self, x):
         return [tok.text.lower() for tok in self.tokenizer(x)]
@@ -30,21 +40,19 @@ class WhitespaceTokenizer(object):
 class CustomTokenizer(object):
     def __init__(self):
         #self.allowed_re = re.compile('^[A-Za-z0-9.,?!()]*$')
-        self.punct = re.compile('[,!.?()]')
+        self.token_re = re.compile('[^\\s,!.?()]+|[,!.?()]')
+
+    def __call__(self, text):
+        return self.token_re.findall(text)
+
+
+class RegexTokenizer(object):
+    # lowercases text and splits it into unicode alphanumeric words and single punctuation chars
+    def __init__(self):
+        self.token_re = re.compile('[^\\W_]+|[^\\w\\s]|_')
 
     def __call__(self, text):
-        substrings = text.split(' ')
-        tokens = []
-        for ss in substrings:
-            punct_match = self.punct.search(ss)
-            if punct_match:
-                start = punct_match.start()
-                ss_tokens = [ss[:start], ss[start], ss[start + 1:]]
-                ss_tokens = [t for t in ss_tokens if len(t) > 0]
-            else:
-                ss_tokens = [ss]
-            tokens.extend(ss_tokens)
-        return tokens
+        return self.token_re.findall(text.lower())
 
 
 class GNewsMixer(Spacy):
@@ -79,7 +87,7 @@ class GNewsMixer(Spacy):
 
 class GNewsTokenizerSW(GNewsMixer):
     def __init__(self):
-        self.spacy_en = spacy.load('en')
+        self.spacy_en = load_spacy()
         self.tokenizer = self.spacy_en.tokenizer
         self.remove_all_stopwords()
         self.add_stopwords(GNEWS_STOP_WORDS)
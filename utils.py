@@ -1,6 +1,8 @@
 # Different utils.
 
 import subprocess
+import csv
+import contextlib
 import pandas as pd
 import numpy as np
 import time
@@ -35,6 +37,12 @@ def f1_metric(tp, n_targs, n_preds):
     return f1
 
 
+@contextlib.contextmanager
+def nullcontext():
+    # empty context manager, contextlib.nullcontext exists only since python 3.7
+    yield
+
+
 def print_duration(time_start, message):
     time_end = time.time()
     seconds = int(time_end - time_start)
@@ -61,10 +69,15 @@ def dict_to_csv(dict, csvname, mode, orient, reverse=False, header=True):
         df = pd.DataFrame.from_dict(dict, orient='index')
         df.to_csv(csvname, header=False, mode=mode)
     if orient == 'columns':
-        df = pd.DataFrame(dict, index=[0])
-        if reverse: #reverse dataframe columnes
-            df = df.iloc[:, ::-1]
-        df.to_csv(csvname, index=False, mode=mode, header=header)
+        # one row is written with csv module, without creating dataframe
+        columns = list(dict.keys())
+        if reverse: #reverse columns
+            columns = columns[::-1]
+        with open(csvname, mode, newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            if header:
+                writer.writeheader()
+            writer.writerow(dict)
     # TODO: append rows considering columns names
 
 